@@ -46,6 +46,8 @@ s3 = boto3.client(
 CSV_OBJECT_KEY = 'peer_matching_data_v2.csv' 
 FEEDBACK_OBJECT_KEY = 'peer_finder_feedback.csv'
 SESSION_FEEDBACK_OBJECT_KEY = 'peer_session_feedback.csv'
+SESSION_FEEDBACK_STATS_OBJECT_KEY = 'peer_session_feedback_stats.json'
+SAFEGUARD_RESOLUTIONS_OBJECT_KEY = 'peer_session_safeguard_resolutions.json'
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD')
 
 # === PROGRAM CREDENTIALS ===
@@ -256,6 +258,139 @@ def upload_csv(df, key=CSV_OBJECT_KEY):
     df.to_csv(csv_buffer, index=False)
     s3.put_object(Bucket=AWS_S3_BUCKET, Key=key, Body=csv_buffer.getvalue(), ContentType='text/csv')
 
+def download_json(key):
+    try:
+        obj = s3.get_object(Bucket=AWS_S3_BUCKET, Key=key)
+        return json.loads(obj['Body'].read().decode('utf-8'))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ['NoSuchKey', '404']:
+            return None
+        raise
+
+def upload_json(data, key):
+    s3.put_object(Bucket=AWS_S3_BUCKET, Key=key, Body=json.dumps(data), ContentType='application/json')
+
+# === SESSION FEEDBACK AGGREGATES ===
+# Running totals per program and per program/role, updated on every submission
+# so the admin dashboard never has to re-read the full session feedback CSV.
+# The JSON is a cache, not the source of truth: the read-modify-write is not
+# atomic, so concurrent submissions (or a failed upload) can drop increments.
+# /api/admin/session-feedback-stats/rebuild recomputes it from the CSV plus
+# the safeguard resolutions object.
+FEEDBACK_PROGRAMS = ['VA', 'AiCE', 'PF']
+FEEDBACK_ROLES = ['Volunteer', 'HelpSeeker', 'StudyBuddy']
+
+def new_session_feedback_stats():
+    return {'total': 0, 'programs': {}, 'groups': {}, 'open_safeguard_flags': [], 'updated_at': ''}
+
+def new_feedback_counter(**labels):
+    return dict(labels, count=0, peer_rating={}, session_rating={}, session_happened=0,
+                rematch_requests=0, safeguard_flags_total=0, open_safeguard_flags=0)
+
+def clean_feedback_value(val):
+    if val is None or (isinstance(val, float) and pd.isna(val)): return ''
+    return str(val).strip()
+
+def feedback_program(row):
+    program = clean_feedback_value(row.get('program'))
+    return program if program in FEEDBACK_PROGRAMS else 'Other'
+
+def feedback_role(row):
+    # The form only asks for a role when the session took place
+    role = clean_feedback_value(row.get('role'))
+    if not role: return 'No session'
+    return role if role in FEEDBACK_ROLES else 'Other'
+
+def apply_session_feedback(stats, row, resolved=False):
+    program = feedback_program(row)
+    role = feedback_role(row)
+    counters = [
+        stats['programs'].setdefault(program, new_feedback_counter(program=program)),
+        stats['groups'].setdefault(f"{program}|{role}", new_feedback_counter(program=program, role=role))
+    ]
+    stats['total'] += 1
+
+    ratings = {}
+    for field in ['peer_rating', 'session_rating']:
+        try:
+            rating = float(clean_feedback_value(row.get(field)))
+        except (ValueError, TypeError, OverflowError):
+            continue
+        # Only whole-star ratings count; 0 means the session never happened
+        if rating.is_integer() and 1 <= rating <= 5:
+            ratings[field] = str(int(rating))
+
+    happened = clean_feedback_value(row.get('session_happened')).upper().startswith('YES')
+    rematch = clean_boolean(clean_feedback_value(row.get('rematch_request')))
+    safeguard = clean_boolean(clean_feedback_value(row.get('safeguard_issue')))
+
+    for c in counters:
+        c['count'] += 1
+        for field, rating in ratings.items():
+            c[field][rating] = c[field].get(rating, 0) + 1
+        if happened: c['session_happened'] += 1
+        if rematch: c['rematch_requests'] += 1
+        if safeguard: c['safeguard_flags_total'] += 1
+        if safeguard and not resolved: c['open_safeguard_flags'] += 1
+
+    if safeguard and not resolved:
+        stats['open_safeguard_flags'].append({
+            'id': clean_feedback_value(row.get('id')),
+            'timestamp': clean_feedback_value(row.get('timestamp')),
+            'email': clean_feedback_value(row.get('email')),
+            'program': program,
+            'role': role,
+            'safeguard_details': clean_feedback_value(row.get('safeguard_details'))
+        })
+    return stats
+
+def build_session_feedback_stats(df, resolutions):
+    stats = new_session_feedback_stats()
+    for row in df.to_dict('records'):
+        apply_session_feedback(stats, row, resolved=clean_feedback_value(row.get('id')) in resolutions)
+    return stats
+
+def load_safeguard_resolutions():
+    # {feedback_id: resolved_at}, kept apart from the feedback CSV so resolving
+    # a flag never rewrites (and races with) peer submissions
+    return download_json(SAFEGUARD_RESOLUTIONS_OBJECT_KEY) or {}
+
+def save_session_feedback_stats(stats):
+    stats['updated_at'] = datetime.now(timezone.utc).isoformat()
+    upload_json(stats, SESSION_FEEDBACK_STATS_OBJECT_KEY)
+
+def rebuild_session_feedback_stats_from_csv(df=None):
+    if df is None: df = download_csv(SESSION_FEEDBACK_OBJECT_KEY)
+    stats = build_session_feedback_stats(df, load_safeguard_resolutions())
+    save_session_feedback_stats(stats)
+    return stats
+
+def load_session_feedback_stats():
+    # Falls back to a one-off rebuild from the CSV if the aggregate object is missing
+    stats = download_json(SESSION_FEEDBACK_STATS_OBJECT_KEY)
+    if stats is None:
+        stats = rebuild_session_feedback_stats_from_csv()
+    return stats
+
+def summarize_rating(dist):
+    n = sum(dist.values())
+    avg = round(sum(int(k) * v for k, v in dist.items()) / n, 2) if n > 0 else None
+    return {"count": n, "average": avg, "distribution": {str(i): dist.get(str(i), 0) for i in range(1, 6)}}
+
+def summarize_feedback_counter(c):
+    res = {k: c[k] for k in ['program', 'role'] if k in c}
+    res.update({
+        "count": c['count'],
+        "peer_rating": summarize_rating(c['peer_rating']),
+        "session_rating": summarize_rating(c['session_rating']),
+        "session_happened": c['session_happened'],
+        "session_happened_rate": f"{(c['session_happened'] / c['count'] * 100):.1f}%" if c['count'] > 0 else "0.0%",
+        "rematch_requests": c['rematch_requests'],
+        "open_safeguard_flags": c['open_safeguard_flags'],
+        "safeguard_flags_total": c['safeguard_flags_total']
+    })
+    return res
+
 def availability_match(a1, a2):
     return (a1 == 'Flexible' or a2 == 'Flexible' or a1 == a2) if (pd.notna(a1) and pd.notna(a2)) else False
 
@@ -643,6 +778,20 @@ def submit_peer_session_feedback():
     
     df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
     upload_csv(df, SESSION_FEEDBACK_OBJECT_KEY)
+
+    # The submission is saved at this point; aggregate failures must not turn it into an error
+    try:
+        if clean_boolean(clean_feedback_value(new_row['safeguard_issue'])):
+            logger.warning(f"Safeguard issue reported in session feedback {new_row['id']} ({new_row['program']})")
+
+        # Update running aggregates (rebuild from the CSV we already hold if none exist yet)
+        stats = download_json(SESSION_FEEDBACK_STATS_OBJECT_KEY)
+        if stats is None:
+            rebuild_session_feedback_stats_from_csv(df)
+        else:
+            save_session_feedback_stats(apply_session_feedback(stats, new_row))
+    except Exception as e:
+        logger.error(f"Session feedback stats update failed for {new_row['id']}: {e}")
     
     return jsonify({"success": True})
 
@@ -653,5 +802,69 @@ def dl_session_feedback():
         return jsonify({"error": "Unauthorized"}), 401
     return Response(download_csv(SESSION_FEEDBACK_OBJECT_KEY).to_csv(index=False), mimetype='text/csv')
 
+@app.route('/api/admin/session-feedback-stats', methods=['POST'])
+@api_wrapper
+def session_feedback_stats():
+    if request.get_json().get('password') != ADMIN_PASSWORD: 
+        return jsonify({"error": "Unauthorized"}), 401
+
+    stats = load_session_feedback_stats()
+    programs = [summarize_feedback_counter(c) for c in stats['programs'].values()]
+    breakdown = [summarize_feedback_counter(c) for c in stats['groups'].values()]
+
+    total = stats['total']
+    happened = sum(c['session_happened'] for c in stats['programs'].values())
+    summary = {
+        "total": total,
+        "session_happened_rate": f"{(happened / total * 100):.1f}%" if total > 0 else "0.0%",
+        "rematch_requests": sum(c['rematch_requests'] for c in stats['programs'].values()),
+        "open_safeguard_flags": len(stats['open_safeguard_flags']),
+        "updated_at": stats['updated_at']
+    }
+    return jsonify({"success": True, "summary": summary, "programs": programs, "breakdown": breakdown})
+
+@app.route('/api/admin/session-feedback-stats/rebuild', methods=['POST'])
+@api_wrapper
+def rebuild_session_feedback_stats():
+    if request.get_json().get('password') != ADMIN_PASSWORD: 
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # Recompute from the CSV to repair counts lost to concurrent or failed updates
+    stats = rebuild_session_feedback_stats_from_csv()
+    return jsonify({"success": True, "total": stats['total'], "open_safeguard_flags": len(stats['open_safeguard_flags'])})
+
+@app.route('/api/admin/safeguard-flags', methods=['POST'])
+@api_wrapper
+def safeguard_flags():
+    if request.get_json().get('password') != ADMIN_PASSWORD: 
+        return jsonify({"error": "Unauthorized"}), 401
+    stats = load_session_feedback_stats()
+    return jsonify({"success": True, "flags": stats['open_safeguard_flags']})
+
+@app.route('/api/admin/safeguard-flags/resolve', methods=['POST'])
+@api_wrapper
+def resolve_safeguard_flag():
+    data = request.get_json()
+    if data.get('password') != ADMIN_PASSWORD: return jsonify({"error": "Unauthorized"}), 401
+
+    flag_id = str(data.get('feedback_id', '')).strip()
+    stats = load_session_feedback_stats()
+    resolutions = load_safeguard_resolutions()
+    flag = next((f for f in stats['open_safeguard_flags'] if f['id'] == flag_id), None)
+    if flag is None:
+        if flag_id in resolutions: return jsonify({"success": True})
+        return jsonify({"error": "Flag not found"}), 404
+
+    # Record the resolution first so a stats rebuild keeps it closed. Only admins
+    # write this object, so two resolves landing at once is the only lost-update window.
+    resolutions[flag_id] = datetime.now(timezone.utc).isoformat()
+    upload_json(resolutions, SAFEGUARD_RESOLUTIONS_OBJECT_KEY)
+
+    stats['open_safeguard_flags'] = [f for f in stats['open_safeguard_flags'] if f['id'] != flag_id]
+    for c in [stats['programs'].get(flag['program']), stats['groups'].get(f"{flag['program']}|{flag['role']}")]:
+        if c: c['open_safeguard_flags'] = max(0, c['open_safeguard_flags'] - 1)
+    save_session_feedback_stats(stats)
+    return jsonify({"success": True})
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000, host='0.0.0.0')